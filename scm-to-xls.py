@@ -1,38 +1,29 @@
 #!/usr/bin/env python3
 
-from os import path, getcwd
+import re
+from os import path, getcwd, environ
 from sys import exit
-
-from openpyxl import Workbook
-from openpyxl.styles import colors, Font, Color, Alignment, Border, Side, PatternFill
-
-from optparse import OptionParser
+from shutil import which
+from subprocess import Popen, PIPE, run
+from functools import partial
+from queue import Queue
+from threading import Thread
+
+from argparse import ArgumentParser
+from importlib.util import find_spec
 from datetime import datetime
 
-from string import ascii_uppercase
-
-_git_available = False
-_hg_available = False
-_svn_available = False
-
-try:
-    from pygit2 import Repository
-    from pygit2 import GIT_SORT_TIME, GIT_DIFF_STATS_FULL
-    _git_available = True
-except ImportError:
-    pass
+# The SCM bindings and openpyxl are only imported once they are needed, so
+# printing the help or a usage error stays fast.
+_pygit2_available = find_spec("pygit2") is not None
+_svn_available = find_spec("svn") is not None
+_pyexcelerate_available = find_spec("pyexcelerate") is not None
 
-try:
-    import hglib
-    _hg_available = True
-except ImportError:
-    pass
+_git_cmd = which("git")
+_git_available = _pygit2_available or _git_cmd is not None
 
-try:
-    import svn.local
-    _svn_available = True
-except ImportError:
-    pass
+_hg_cmd = which("hg")
+_hg_available = _hg_cmd is not None
 
 
 USAGE="""
@@ -50,6 +41,10 @@ class LogEntry:
         self.time = None
         self.diff = None
 
+    # The values of the data columns every writer exports.
+    def row(self):
+        return (self.time, str(self.id), self.msg or "", self.author or "", "\n".join(self.diff))
+
 
 class ScmAccessor:
     def __init__(self, repo_path, start_rev=None):
@@ -61,84 +56,254 @@ class ScmAccessor:
         raise RuntimeError("Not meant to be called in parent class")
 
 
+# Record and field separators used to parse the output of a single "git log"
+# call. With -z, the changed files of a commit are separated by NUL bytes.
+_GIT_LOG_FORMAT = "--pretty=format:%x01%H%x1f%ct%x1f%cn%x1f%ce%x1f%B%x1f"
+
+
+# Splits a stream into records at a single byte separator. Only new chunks are
+# searched, the pieces of an incomplete record are joined once it is complete.
+def _read_records(stream, sep, bufsize=65536):
+    pending = []
+    for chunk in iter(lambda: stream.read(bufsize), b""):
+        if sep not in chunk:
+            pending.append(chunk)
+            continue
+
+        records = chunk.split(sep)
+        pending.append(records[0])
+        records[0] = b"".join(pending)
+        pending = [records.pop()]
+
+        for r in records:
+            if r:
+                yield r
+
+    record = b"".join(pending)
+    if record:
+        yield record
+
+
+# "git log --diff-merges" is needed to list the files of merge commits.
+_GIT_MIN_VERSION = (2, 31)
+
+
+def _git_version():
+    output = run([_git_cmd, "--version"], stdout=PIPE, check=False).stdout.decode("ascii", "replace")
+    # "git version 2.39.5", possibly followed by a vendor suffix.
+    match = re.match(r"git version (\d+)\.(\d+)", output)
+    return (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+
+
+# Per-process repository cache for the git workers. pygit2 Repository objects
+# must not be shared across a fork, so every worker opens its own copy.
+_worker_repo = None
+_worker_diff_flags = 0
+
+
+def _init_git_worker(repo_path):
+    global _worker_repo, _worker_diff_flags
+    from pygit2 import Repository, GIT_DIFF_SKIP_BINARY_CHECK
+
+    _worker_repo = Repository(path.join(repo_path))
+    _worker_diff_flags = GIT_DIFF_SKIP_BINARY_CHECK
+
+
+def _extract_one(oid):
+    c = _worker_repo[oid]
+    print("Processing commit %s" % c.id)
+
+    # Only the names of the changed files are needed. Comparing the trees
+    # is enough for that, the blobs are never loaded.
+    stripped_diff = []
+    if c.parents:
+        diff = c.tree.diff_to_tree(c.parents[0].tree, flags=_worker_diff_flags)
+        stripped_diff = [delta.new_file.path for delta in diff.deltas]
+
+    return (str(c.id), c.message.strip("\n"), c.committer.name, c.committer.email,
+            c.commit_time, stripped_diff)
+
+
 class GitAccessor(ScmAccessor):
-    def __init__(self, repo_path, start_rev=None):
+    def __init__(self, repo_path, start_rev=None, numprocesses=None, write_commit_graph=False):
         super().__init__(repo_path=repo_path, start_rev=start_rev)
-        self._scm = Repository(path.join(repo_path))
+        self._numprocesses = numprocesses
+
+        # git and libgit2 both pick up the commit-graph file automatically,
+        # which makes walking the history considerably faster.
+        if write_commit_graph:
+            if _git_cmd is None:
+                print("Can't write the commit-graph, git is not installed.")
+            else:
+                run([_git_cmd, "-C", path.join(repo_path), "config", "core.commitGraph", "true"], check=False)
+                run([_git_cmd, "-C", path.join(repo_path), "commit-graph", "write", "--reachable"], check=False)
+
+        # The git command line tool is preferred, since it scans the history
+        # in a single pass. pygit2 is only used if git is not on the PATH or
+        # too old.
+        self._use_cmd = _git_cmd is not None and _git_version() >= _GIT_MIN_VERSION
+        if not self._use_cmd:
+            if not _pygit2_available:
+                raise RuntimeError("git %i.%i or newer or pygit2 is required" % _GIT_MIN_VERSION)
+
+            from pygit2 import Repository, Commit
+            self._scm = Repository(path.join(repo_path))
+
+            # Resolves short hashes and refs as well, the walk then only
+            # compares Oids.
+            self._start_oid = None
+            if start_rev:
+                try:
+                    self._start_oid = self._scm.revparse_single(start_rev).peel(Commit).id
+                except (KeyError, ValueError):
+                    raise RuntimeError("Unknown revision %s" % start_rev)
+        elif start_rev:
+            result = run([_git_cmd, "-C", path.join(repo_path), "rev-parse", "--verify", "--quiet",
+                          start_rev + "^{commit}"], stdout=PIPE, check=False)
+            if result.returncode:
+                raise RuntimeError("Unknown revision %s" % start_rev)
+            self._start_rev = result.stdout.decode("ascii").strip()
 
     def get_log(self):
-        data = []
-
-        for c in self._scm.walk(self._scm.head.target, GIT_SORT_TIME):
-            print("Processing commit %s" % c.id)
+        if self._use_cmd:
+            return self._get_log_cmd()
+        return self._get_log_pygit2()
+
+    def _get_log_cmd(self):
+        stopped = False
+
+        cmd = [_git_cmd, "-C", path.join(self._repo_path),
+               "-c", "log.showRoot=false", "log", _GIT_LOG_FORMAT, "--date-order",
+               "--name-only", "--no-renames", "--diff-merges=first-parent", "-z"]
+
+        with Popen(cmd, stdout=PIPE) as proc:
+            for record in _read_records(proc.stdout, b"\x01"):
+                commitid, time, author, email, msg, files = record.split(b"\x1f", 5)
+                commitid = commitid.decode("ascii")
+                print("Processing commit %s" % commitid)
+
+                e = LogEntry()
+                e.id = commitid
+                e.msg = msg.decode("utf-8", "replace").strip("\n")
+                e.author = author.decode("utf-8", "replace")
+                e.email = email.decode("utf-8", "replace")
+                e.time = datetime.fromtimestamp(int(time))
+                e.diff = [f.decode("utf-8", "replace") for f in files.lstrip(b"\n").split(b"\0") if f]
+                yield e
+
+                if self._start_rev and commitid == self._start_rev:
+                    proc.kill()
+                    stopped = True
+                    break
+
+        if proc.returncode and not stopped:
+            raise RuntimeError("git log failed with exit code %i" % proc.returncode)
+
+    def _get_log_pygit2(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from pygit2 import GIT_SORT_TIME, GIT_SORT_TOPOLOGICAL
+
+        # Walking the history is cheap, the diffs are not. Collect the commits
+        # first and let the worker processes compute the diffs.
+        # Sorting by time alone can degrade badly on merge-heavy histories, the
+        # topological sort keeps the walk in order of commit time as well and
+        # matches "git log --date-order". GIT_SORT_NONE would be fastest, but the
+        # export is expected to be in chronological order.
+        oids = []
+        for c in self._scm.walk(self._scm.head.target, GIT_SORT_TOPOLOGICAL | GIT_SORT_TIME):
+            oids.append(str(c.id))
+
+            if self._start_oid is not None and c.id == self._start_oid:
+                break
 
-            diff = self._scm.diff(c, c.parents[0]).stats.format(GIT_DIFF_STATS_FULL, 1) if c.parents else ""
+        with ProcessPoolExecutor(max_workers=self._numprocesses,
+                                 initializer=_init_git_worker,
+                                 initargs=(self._repo_path,)) as executor:
+            for id_hex, msg, author, email, time, stripped_diff in executor.map(_extract_one, oids, chunksize=64):
+                e = LogEntry()
+                e.id = id_hex
+                e.msg = msg
+                e.author = author
+                e.email = email
+                e.time = datetime.fromtimestamp(time)
+                e.diff = stripped_diff
+                yield e
 
-            diff = diff.splitlines()
-            if len(diff) >= 1:
-                diff = diff[:-1]
 
-            stripped_diff = [ d.split("|")[0].strip() for d in diff ]
+# All fields needed from Mercurial, in a single templated "hg log" output.
+# Fields are separated by \x1f, records by \x1e, changed files by newlines.
+# The third field is the final commit id, "<rev>:<node> - <tags>".
+_HG_LOG_TEMPLATE = (b'{rev}\x1f{p2rev}\x1f{rev}:{node|short}{if(tags, " - {tags}")}\x1f{author}\x1f'
+                    b'{date|hgdate}\x1f{desc}\x1f{join(files, "\\n")}\x1e')
 
-            e = LogEntry()
-            e.id = c.id
-            e.msg = c.message.strip("\n")
-            e.author = c.committer.name
-            e.email = c.committer.email
-            e.time = datetime.fromtimestamp(c.commit_time)
-            e.diff = stripped_diff
-            data.append(e)
-
-            if self._start_rev and c.id.hex == self._start_rev:
-                break
 
-        return data
+# HGPLAIN keeps user configuration like [defaults] or [alias] from changing
+# the output, the parsers expect it UTF-8 encoded.
+def _hg_env():
+    return dict(environ, HGPLAIN="1", HGENCODING="utf-8")
 
 
 class HgAccessor(ScmAccessor):
-    def __init__(self, repo_path, start_rev=None):
-        super().__init__(repo_path=repo_path, start_rev=start_rev)
-        self._scm = hglib.open(path.join(repo_path))
-
     def get_log(self):
-        data = []
+        stopped = False
+        cmd = [_hg_cmd, "-R", path.join(self._repo_path), "log", "--template", _HG_LOG_TEMPLATE]
 
-        for c in self._scm.log():
-            print("Processing commit %s" % str(c.rev, 'utf-8'))
+        with Popen(cmd, stdout=PIPE, env=_hg_env()) as proc:
+            for e in self._parse_log(_read_records(proc.stdout, b"\x1e")):
+                yield e
 
-            diff = self._scm.rawcommand([b'log', b'--stat', b'-r%s' % c.rev]).splitlines()
+                # The start revision is either "<rev>" or "<rev>:<node>".
+                commitid = e.id.partition(" ")[0]
+                if self._start_rev and self._start_rev in (commitid, commitid.partition(":")[0]):
+                    proc.kill()
+                    stopped = True
+                    break
 
-            commitid = str(diff[0], 'utf-8').lstrip("changeset:").lstrip(" ")
-            tag = "" if not c.tags else " - " + str(c.tags, 'utf-8')
+        if proc.returncode and not stopped:
+            raise RuntimeError("hg log failed with exit code %i" % proc.returncode)
 
-            if len(diff[5:-2][0]) == 0:
-                diff = diff[1:]
+    def _parse_log(self, records):
+        for record in records:
+            rev, p2rev, commitid, author, date, desc, files = record.split(b"\x1f", 6)
+            rev = rev.decode('utf-8')
+            print("Processing commit %s" % rev)
 
-            stripped_diff = [str(d, 'utf-8').split("|")[0].strip() for d in diff[5:-2]]
+            idx = author.find(b'<')
 
             e = LogEntry()
-            e.id = commitid + tag
-            e.msg = str(c.desc, 'utf-8')
-            e.author = str(c.author, 'utf-8').split("<")[0]
-            e.email = str(c.author, 'utf-8').split("<")[1].rstrip(">")
-            e.time = c.date
-            e.diff = stripped_diff
-            data.append(e)
-
-            if self._start_rev and (str(c.rev, 'utf-8') == self._start_rev or commitid == self._start_rev):
-                break
-
-        return data
+            e.id = commitid.decode('utf-8', 'replace')
+            e.msg = desc.decode('utf-8', 'replace')
+            if idx == -1:
+                e.author = author.decode('utf-8', 'replace')
+                e.email = ""
+            else:
+                e.author = author[:idx].decode('utf-8', 'replace').strip()
+                e.email = author[idx+1:].rstrip(b'>').decode('utf-8', 'replace')
+            e.time = datetime.fromtimestamp(int(date.split(b' ', 1)[0]))
+            if p2rev == b"-1":
+                files = files.split(b'\n')
+            else:
+                files = self._merge_files(rev)
+            e.diff = [f.decode('utf-8', 'replace') for f in files if f]
+            yield e
+
+    # {files} of a merge only lists the files touched by the merge itself. Like
+    # for git, report the changes against the first parent instead.
+    def _merge_files(self, rev):
+        cmd = [_hg_cmd, "-R", path.join(self._repo_path), "status", "--change", rev, "-n", "--print0"]
+        result = run(cmd, stdout=PIPE, env=_hg_env(), check=False)
+        if result.returncode:
+            raise RuntimeError("hg status failed with exit code %i" % result.returncode)
+        return result.stdout.split(b"\0")
 
 
 class SvnAccessor(ScmAccessor):
     def __init__(self, repo_path, start_rev):
         super().__init__(repo_path=repo_path, start_rev=start_rev)
+        import svn.local
         self._scm = svn.local.LocalClient(path.join(repo_path))
 
     def get_log(self):
-        data = []
-
         for c in self._scm.log_default():
             print("Processing commit %i" % c.revision)
 
@@ -151,125 +316,237 @@ class SvnAccessor(ScmAccessor):
             e.id = c.revision
             e.msg = c.msg
             e.author = c.author
-            e.time = c.date
+            # svn reports timezone-aware dates, which Excel can't store. Keep
+            # local time, like the other accessors do.
+            e.time = c.date.astimezone().replace(tzinfo=None) if c.date.tzinfo else c.date
             e.diff = diff
-            data.append(e)
+            yield e
 
             if self._start_rev and str(c.revision) == self._start_rev:
                 break
 
-        return data
 
 
+# Runs the given generator in a separate thread, so reading the history
+# overlaps with writing the rows. Exceptions are passed on to the consumer.
+def _prefetch(iterable, maxsize=1000):
+    queue = Queue(maxsize=maxsize)
+    end = object()
+    error = []
+
+    def produce():
+        try:
+            for item in iterable:
+                queue.put(item)
+        except BaseException as ex:
+            error.append(ex)
+        finally:
+            queue.put(end)
+
+    Thread(target=produce, daemon=True).start()
+
+    while True:
+        item = queue.get()
+        if item is end:
+            break
+        yield item
+
+    if error:
+        raise error[0]
+
 
 class Writer:
-    def __init__(self, filename):
+    title = None
+    columns = ("Date", "Commit-ID", "Message", "Author", "Changed files")
+    column_widths = (20, 20, 50, 20, 25, 20, 20, 20)
+
+    def __init__(self, filename, fast=False):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+
         self._filename = filename
-        self._workbook = Workbook()
-        self._columns = ["Date", "Commit-ID", "Message", "Author", "Changed files"]
-
-        ws = self._workbook.active
-        ws.column_dimensions["A"].width = 20
-        ws.column_dimensions["B"].width = 20
-        ws.column_dimensions["C"].width = 50
-        ws.column_dimensions["D"].width = 20
-        ws.column_dimensions["E"].width = 25
-        ws.column_dimensions["F"].width = 20
-        ws.column_dimensions["G"].width = 20
-        ws.column_dimensions["H"].width = 20
+        self._fast = fast
+        self._cell = WriteOnlyCell
+        self._workbook = Workbook(write_only=True)
+        self._worksheet = self._workbook.create_sheet()
+
+        # Rows are streamed to the file in write-only mode, so the styles are
+        # created once and attached to every cell as it is written.
+        thin = Side(border_style="thin", color="00000000")
+
+        self._header_font = Font(bold=True)
+        self._header_fill = PatternFill("solid", fgColor="000099ff")
+        self._header_border = Border(top=thin, left=thin, right=thin, bottom=thin)
+        self._top_align = Alignment(vertical="top")
+        self._wrap_align = Alignment(wrap_text=True, shrink_to_fit=True, vertical="top")
+        self._mono_font = Font(name="Monospace", size=8)
+        self._msg_font = Font(size=10)
+        self._body_border = Border(left=thin, right=thin)
+        self._last_border = Border(left=thin, right=thin, bottom=thin)
+        self._date_format = "YYYY-MM-DD HH:MM:SS"
+
+        # Font, alignment and number format of the data cells, per column, and
+        # the empty cells filling up the columns beyond the exported values.
+        self._cell_styles = [(None, self._top_align, None)] * len(self.columns)
+        self._cell_styles[0] = (None, self._top_align, self._date_format)
+        self._cell_styles[1] = (self._mono_font, self._top_align, None)
+        self._cell_styles[2] = (self._msg_font, self._wrap_align, None)
+        self._padding = (None,) * (len(self.columns) - len(Writer.columns))
+
+        # Column widths have to be set before the first row is written.
+        ws = self._worksheet
+        for letter, width in zip("ABCDEFGH", self.column_widths):
+            ws.column_dimensions[letter].width = width
 
     def write_header(self):
-        ws = self._workbook.active
+        ws = self._worksheet
+        ws.append([self.title, "Generated on %s" % datetime.now().isoformat(" ")])
+
+        header = []
+        for name in self.columns:
+            cell = self._cell(ws, value=name)
+            cell.font = self._header_font
+            cell.fill = self._header_fill
+            cell.border = self._header_border
+            header.append(cell)
 
         ws.append([])
-        ws.append(self._columns)
+        ws.append(header)
+
+    def _data_row(self, d, border):
+        ws = self._worksheet
+        values = d.row() + self._padding
 
-        for c in ascii_uppercase[:len(self._columns)]:
-            ws[c+str(ws.max_row)].font = Font(bold=True)
-            ws[c+str(ws.max_row)].fill = PatternFill("solid", fgColor="000099ff")
-            ws[c+str(ws.max_row)].border = Border(top=Side(border_style="thin", color="00000000"),
-                                                  left=Side(border_style="thin", color="00000000"),
-                                                  right=Side(border_style="thin", color="00000000"),
-                                                  bottom=Side(border_style="thin", color="00000000"))
+        row = []
+        for v, (font, alignment, number_format) in zip(values, self._cell_styles):
+            cell = self._cell(ws, value=v)
+            if font is not None:
+                cell.font = font
+            if number_format is not None:
+                cell.number_format = number_format
+            cell.alignment = alignment
+            cell.border = border
+            row.append(cell)
 
-    def write_data(self):
-        raise RuntimeError("Not to be called in base class")
+        return row
 
     def write_data(self, accessor):
-        ws = self._workbook.active
+        ws = self._worksheet
 
-        for d in accessor.get_log():
-            ws.append([d.time.strftime("%Y-%m-%d %H:%M:%S"), str(d.id), str(d.msg), str(d.author), "\n".join(d.diff)])
+        # Written rows can not be changed anymore. Hold back one entry, so the
+        # last row can be written with the closing bottom border.
+        log = accessor.get_log()
+        if self._fast:
+            log = _prefetch(log)
 
-            for c in ascii_uppercase[:len(self._columns)]:
-                ws[c+str(ws.max_row)].alignment = Alignment(vertical="top")
+        last = None
+        for d in log:
+            if last is not None:
+                ws.append(self._data_row(last, self._body_border))
+            last = d
 
-            ws["B"+str(ws.max_row)].font = Font(name="Monospace", size=8)
-            ws["C"+str(ws.max_row)].font = Font(size=10)
-            ws["C"+str(ws.max_row)].alignment = Alignment(wrap_text=True, shrink_to_fit=True, vertical="top")
-            #ws.row_dimensions[ws.max_row].height = d.msg.count("\n") * 15
+        if last is not None:
+            ws.append(self._data_row(last, self._last_border))
 
-            for c in ascii_uppercase[:len(self._columns)]:
-                ws[c+str(ws.max_row)].border = Border(left=Side(border_style="thin", color="00000000"),
-                                                      right=Side(border_style="thin", color="00000000"))
+    def save(self):
+        if not self._fast:
+            self._workbook.save(self._filename)
+            return
 
-        for c in ascii_uppercase[:len(self._columns)]:
-            ws[c+str(ws.max_row)].border = Border(left=Side(border_style="thin", color="00000000"),
-                                                  right=Side(border_style="thin", color="00000000"),
-                                                  bottom=Side(border_style="thin", color="00000000"))
+        # openpyxl has no setting for the compression level. Trade some file
+        # size for speed by handing it a ZipFile using the fastest level.
+        from openpyxl.writer import excel as excel_writer
 
-    def save(self):
-        self._workbook.save(self._filename)
+        zipfile = excel_writer.ZipFile
+        excel_writer.ZipFile = partial(zipfile, compresslevel=1)
+        try:
+            self._workbook.save(self._filename)
+        finally:
+            excel_writer.ZipFile = zipfile
 
 
 class CommitHistoryWriter(Writer):
-    def __init__(self, filename):
-        super().__init__(filename)
+    title = "Commit history"
 
-    def write_header(self):
-        ws = self._workbook.active
-        ws['A1'] = "Commit history"
-        ws['B1'] = "Generated on %s" % datetime.now().isoformat(" ")
 
-        super().write_header()
+class ImpactStatementWriter(Writer):
+    title = "Impact statement"
+    columns = Writer.columns + ("Affected testcases", "Tested with version")
 
 
-class ImpactStatementWriter(Writer):
-    def __init__(self, filename):
-        super().__init__(filename=filename)
+# Unstyled output through PyExcelerate, which writes all rows in one go and is
+# a lot faster than openpyxl. Only used in fast mode, so the history is always
+# read in a separate thread.
+class FastWriter:
+    def __init__(self, filename, title, columns):
+        self._filename = filename
+        self._title = title
+        self._columns = columns
+        self._rows = []
 
     def write_header(self):
-        ws = self._workbook.active
+        self._rows.append([self._title, "Generated on %s" % datetime.now().isoformat(" ")])
+        self._rows.append([])
+        self._rows.append(self._columns)
+
+    def write_data(self, accessor):
+        self._rows.extend(d.row() for d in _prefetch(accessor.get_log()))
+
+    def save(self):
+        from pyexcelerate import Workbook, Style, Format
+
+        wb = Workbook()
+        ws = wb.new_sheet("Sheet", data=self._rows)
 
-        ws['A1'] = "Impact statement"
-        ws['B1'] = "Generated on %s" % datetime.now().isoformat(" ")
-        self._columns.extend(["Affected testcases", "Tested with version"])
-        super().write_header()
+        # Column styles are applied to every cell of the column, which gives
+        # the dates a readable format without styling cells one by one.
+        for col, width in enumerate(Writer.column_widths, 1):
+            ws.set_col_style(col, Style(size=width))
+        ws.set_col_style(1, Style(size=Writer.column_widths[0], format=Format("yyyy-mm-dd hh:mm:ss")))
+
+        wb.save(self._filename)
 
 
 
 def main():
-    parser = OptionParser(usage=USAGE)
-
-    parser.add_option("-o", "--outfile", dest="outfile",
-                      help="Output file to write to.")
-    parser.add_option("-s", "--scm", dest="scm",
-                      help="SCM to use. Supported options: git, hg, svn",
-                      default="git")
-    parser.add_option("-I", "--impact", dest="impact",
-                      help="If set, an impact statement is generated.",
-                      action="store_true")
-    parser.add_option("-H", "--history", dest="history",
-                      help="If set, the commit history is exported.",
-                      action="store_true")
-    parser.add_option("-d", "--directory", dest="repo",
-                      help="Path to the repository. If omitted, the location "
-                            "the script is placed at is used.")
-    parser.add_option("-r", "--rev", dest="rev",
-                      help="Revision to start. If omitted, the complete history "
-                           "is used. Dependent on the SCM used!", default=None)
-
-    options, args = parser.parse_args()
+    parser = ArgumentParser(description=USAGE)
+
+    parser.add_argument("-o", "--outfile", dest="outfile",
+                        help="Output file to write to.")
+    parser.add_argument("-s", "--scm", dest="scm",
+                        help="SCM to use. Supported options: git, hg, svn",
+                        default="git")
+    parser.add_argument("-I", "--impact", dest="impact",
+                        help="If set, an impact statement is generated.",
+                        action="store_true")
+    parser.add_argument("-H", "--history", dest="history",
+                        help="If set, the commit history is exported.",
+                        action="store_true")
+    parser.add_argument("-d", "--directory", dest="repo",
+                        help="Path to the repository. If omitted, the location "
+                             "the script is placed at is used.")
+    parser.add_argument("-r", "--rev", dest="rev",
+                        help="Revision to start. If omitted, the complete history "
+                             "is used. Dependent on the SCM used!", default=None)
+    parser.add_argument("-j", "--numprocesses", dest="numprocesses", type=int,
+                        help="Number of worker processes used to extract the git "
+                             "history with pygit2, if git 2.31 or newer is not "
+                             "installed. If omitted, all available cores are used.",
+                        default=None)
+    parser.add_argument("-g", "--write-commit-graph", dest="commit_graph",
+                        help="Write the git commit-graph before reading the history. "
+                             "Speeds up large repositories. To keep it up to date "
+                             "permanently, run 'git maintenance start' once instead.",
+                        action="store_true")
+    parser.add_argument("-f", "--fast", dest="fast",
+                        help="Read the history in a separate thread while writing. "
+                             "If PyExcelerate is installed, it is used to write an "
+                             "unstyled file. Otherwise, the output file is "
+                             "compressed less.",
+                        action="store_true")
+
+    options = parser.parse_args()
 
     if not options.history and not options.impact:
         print("Not sure what to do. Impact analysis (-I) or commit history (-H)?")
@@ -286,18 +563,22 @@ def main():
 
     if options.scm == "git":
         if not _git_available:
-            print("Git support not available. Please install pygit2.")
-            sys.exit(-1)
-        accessor = GitAccessor(rpath, rev)
+            print("Git support not available. Please install git or pygit2.")
+            exit(-1)
+        try:
+            accessor = GitAccessor(rpath, rev, options.numprocesses, options.commit_graph)
+        except RuntimeError as ex:
+            print(ex)
+            exit(-1)
     elif options.scm == "hg":
         if not _hg_available:
-            print("Mercurial support not available. Please install python-hglib.")
-            sys.exit(-1)
+            print("Mercurial support not available. Please install Mercurial (hg).")
+            exit(-1)
         accessor = HgAccessor(rpath, rev)
     elif options.scm == "svn":
         if not _svn_available:
             print("SVN support not available. Please install svn.")
-            sys.exit(-1)
+            exit(-1)
         accessor = SvnAccessor(rpath, rev)
 
     outfile = options.outfile
@@ -305,12 +586,19 @@ def main():
     if not outfile.endswith(".xlsx"):
         outfile += ".xlsx"
 
+    fast_writer = options.fast and _pyexcelerate_available
+
     if options.history:
         print("Generating commit history...")
-        writer = CommitHistoryWriter("History-" + outfile)
+        writer_class, outfile = CommitHistoryWriter, "History-" + outfile
     elif options.impact:
         print("Generating impact statement...")
-        writer = ImpactStatementWriter("Impacts-" + outfile)
+        writer_class, outfile = ImpactStatementWriter, "Impacts-" + outfile
+
+    if fast_writer:
+        writer = FastWriter(outfile, writer_class.title, writer_class.columns)
+    else:
+        writer = writer_class(outfile, options.fast)
 
     writer.write_header()
     writer.write_data(accessor=accessor)